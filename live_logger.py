@@ -9,10 +9,48 @@ import csv
 import time
 import sys
 import os
+import io
 from datetime import datetime
 import signal
 import serial
 import re
+import threading
+import selectors
+import shutil
+
+try:
+    from meshtastic.serial_interface import SerialInterface
+    from pubsub import pub
+except ImportError:
+    SerialInterface = None  # Fall back to scraping the meshtastic CLI
+
+# NMEA matching is done on raw bytes, so no line is ever decoded
+VALID_FIXES = (b'1', b'2')  # GPS and DGPS fix quality
+GPS_BUF_MAX = 1024  # Drop a partial sentence longer than this (line noise)
+GPS_POLL_SECONDS = 0.25  # Poll interval when the port can't be waited on
+STOP_POLL_SECONDS = 0.25  # How often run() checks for a stop request while waiting
+MAX_SEEN_NODES = 500  # Forget the least recently seen nodes beyond this
+
+DATA_LINE = re.compile(rb'\xe2\x94\x82\s*\d+\s*\xe2\x94\x82')  # "│ 123 │", UTF-8 encoded
+CSV_HEADER = (
+    "timestamp,node_id,short_name,long_name,node_latitude,node_longitude,node_altitude,"
+    "rssi,snr,hw_model,our_latitude,our_longitude,our_altitude\r\n"
+).encode()
+ROW_FORMAT = ",".join(["%s"] * 13) + "\r\n"  # Matches csv.writer's line terminator
+UNIT_STRIP = str.maketrans('', '', '°m')  # Units the table appends to coordinates/altitude
+
+def clean_value(value):
+    """Strip table units from a value; missing values become ''"""
+    return '' if not value or value == 'N/A' else value.translate(UNIT_STRIP)
+
+def write_all(fd, data):
+    """os.write until every byte is out; a single call may write only part"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J"  # ANSI cursor home + erase display
+TABLE_HEADER = f"\n{'ID':<12} {'Name':<20} {'Hardware':<18} {'SNR':<8} {'Last Seen':<12} {'Node Location':<20} {'Our Location':<20}"
 
 class LiveMeshtasticLogger:
     def __init__(self, port=None, csv_file="log.csv", gps_port=None, my_node_id=None):
@@ -20,10 +58,22 @@ class LiveMeshtasticLogger:
         self.csv_file = csv_file
         self.gps_port = gps_port
         self.my_node_id = my_node_id
-        self.running = True
-        self.seen_nodes = {}  # Track unique nodes
+        self.running = True  # Cleared by stop(); run() then cleans up and returns
+        self._shutdown = threading.Event()  # Set by run() on the way out to stop the GPS thread
+        self.seen_nodes = {}  # Track unique nodes, least recently seen first
+        self._last_fp = {}  # node_id -> fingerprint of the last logged row
         self.current_position = {'lat': None, 'lon': None, 'alt': None}
         self.gps_serial = None
+        self._gps_buf = bytearray()  # NMEA bytes read but not yet parsed
+        self.iface = None  # Persistent library session, when available
+        self.lock = threading.Lock()  # Guards seen_nodes and the CSV buffer across threads
+        self._pos_lock = threading.Lock()  # Guards current_position against the GPS thread
+        self._prev_frame = []  # Lines currently on screen
+        self._header = "\n".join([
+            "🚗 Live Meshtastic Node Logger",
+            "=" * 110,
+            f"CSV Log: {self.csv_file}"
+        ])
         
         signal.signal(signal.SIGINT, self.stop)
         signal.signal(signal.SIGTERM, self.stop)
@@ -32,84 +82,137 @@ class LiveMeshtasticLogger:
             self.init_gps()
         
         self.init_csv()
+        self._row_buf = []  # Formatted rows logged since the last flush
+        self._quote_io = io.StringIO()  # Scratch buffer for rows that need CSV quoting
+        self._quote_writer = csv.writer(self._quote_io)
+        self.connect()
     
-    def init_csv(self):
-        """Initialize CSV file with headers"""
+    def connect(self):
+        """Open a persistent session with the node instead of spawning the CLI each poll"""
+        if SerialInterface is None:
+            print("meshtastic library not installed - polling the meshtastic CLI instead")
+            return
+        
         try:
-            with open(self.csv_file, 'x', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    'timestamp',
-                    'node_id', 
-                    'short_name',
-                    'long_name',
-                    'node_latitude',
-                    'node_longitude', 
-                    'node_altitude',
-                    'rssi',
-                    'snr',
-                    'hw_model',
-                    'our_latitude',
-                    'our_longitude',
-                    'our_altitude'
-                ])
-        except FileExistsError:
-            pass
+            self.iface = SerialInterface(devPath=self.port)
+            pub.subscribe(self.on_receive, "meshtastic.receive")
+        except Exception as e:
+            print(f"Could not open meshtastic session ({e}) - polling the meshtastic CLI instead")
+            self.iface = None
+    
+    def on_receive(self, packet, interface):
+        """Log the sending node as soon as one of its packets arrives"""
+        node = (interface.nodes or {}).get(packet.get('fromId'))
+        if node:
+            with self.lock:
+                self.update_seen_nodes([self.node_from_api(node)])
+    
+    def init_csv(self):
+        """Open the CSV once for appending, writing the header if the file is new or empty"""
+        self._csv_fd = os.open(self.csv_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(self._csv_fd).st_size == 0:
+            write_all(self._csv_fd, CSV_HEADER)
     
     def init_gps(self):
         """Initialize GPS connection"""
         try:
-            self.gps_serial = serial.Serial(self.gps_port, 9600, timeout=1)
+            self.gps_serial = serial.Serial(self.gps_port, 9600, timeout=0)
             print(f"GPS connected on {self.gps_port}")
+            
+            # Parse NMEA in the background so a slow GPS never holds up the display
+            self._gps_thread = threading.Thread(target=self.gps_loop, daemon=True)
+            self._gps_thread.start()
         except Exception as e:
             print(f"GPS connection failed: {e}")
             self.gps_serial = None
     
+    def gps_loop(self):
+        """Keep current_position up to date, waking as soon as the GPS sends data"""
+        try:
+            sel = selectors.DefaultSelector()
+            sel.register(self.gps_serial.fileno(), selectors.EVENT_READ)
+        except Exception:
+            sel = None  # No selectable fd for this port (e.g. Windows); poll instead
+        
+        while not self._shutdown.is_set():
+            if sel is None:
+                self.get_gps_position()
+                self._shutdown.wait(GPS_POLL_SECONDS)
+            elif sel.select(timeout=1) and not self.get_gps_position():
+                # Readable with nothing to read means the port hung up or was
+                # unplugged; select would keep firing, so fall back to polling
+                sel.close()
+                sel = None
+    
     def get_gps_position(self):
-        """Get current GPS position from NMEA data"""
+        """Get current GPS position from NMEA data; returns whether any bytes arrived"""
         if not self.gps_serial:
-            return
+            return False
         
+        got_data = False
         try:
-            # Read a few lines to find a good GPS fix
-            for _ in range(10):
-                line = self.gps_serial.readline().decode('ascii', errors='ignore').strip()
-                
-                # Look for GPGGA (Global Positioning System Fix Data)
-                if line.startswith('$GPGGA') or line.startswith('$GNGGA'):
-                    parts = line.split(',')
-                    if len(parts) > 10 and parts[6] in ['1', '2']:  # Valid fix
-                        # Parse latitude
-                        if parts[2] and parts[3]:
-                            lat_deg = float(parts[2][:2])
-                            lat_min = float(parts[2][2:])
-                            lat = lat_deg + lat_min/60
-                            if parts[3] == 'S':
-                                lat = -lat
-                            self.current_position['lat'] = lat
-                        
-                        # Parse longitude
-                        if parts[4] and parts[5]:
-                            lon_deg = float(parts[4][:3])
-                            lon_min = float(parts[4][3:])
-                            lon = lon_deg + lon_min/60
-                            if parts[5] == 'W':
-                                lon = -lon
-                            self.current_position['lon'] = lon
-                        
-                        # Parse altitude
-                        if parts[9]:
-                            self.current_position['alt'] = float(parts[9])
-                        
-                        break
+            # Drain whatever the receiver has queued; read() never blocks (timeout=0)
+            n = self.gps_serial.in_waiting
+            if n:
+                data = self.gps_serial.read(n)
+                got_data = bool(data)
+                self._gps_buf += data
+            
+            # Keep the unfinished sentence for next time
+            *lines, partial = self._gps_buf.split(b'\n')
+            self._gps_buf = bytearray(partial[-GPS_BUF_MAX:])
+            
+            with self._pos_lock:
+                # Newest complete sentence first, so the first good fix is the latest one
+                for line in reversed(lines):
+                    # Look for $xxGGA (Global Positioning System Fix Data) from any talker, still as bytes
+                    if line[3:6] == b'GGA':
+                        parts = line.split(b',')
+                        if len(parts) > 10 and parts[6] in VALID_FIXES:
+                            # Parse latitude
+                            if parts[2] and parts[3]:
+                                lat_deg = float(parts[2][:2])
+                                lat_min = float(parts[2][2:])
+                                lat = lat_deg + lat_min/60
+                                if parts[3] == b'S':
+                                    lat = -lat
+                                self.current_position['lat'] = lat
+                            
+                            # Parse longitude
+                            if parts[4] and parts[5]:
+                                lon_deg = float(parts[4][:3])
+                                lon_min = float(parts[4][3:])
+                                lon = lon_deg + lon_min/60
+                                if parts[5] == b'W':
+                                    lon = -lon
+                                self.current_position['lon'] = lon
+                            
+                            # Parse altitude
+                            if parts[9]:
+                                self.current_position['alt'] = float(parts[9])
+                            
+                            break
         except Exception as e:
             pass  # Silently handle GPS errors
+        
+        return got_data
     
-    def get_meshtastic_position(self):
-        """Try to get our position from the Meshtastic device"""
+    def get_meshtastic_position(self, nodes=None):
+        """Try to get our position from the Meshtastic device, reusing nodes if already fetched"""
+        if self.iface and not self.my_node_id:
+            # The library knows which node is ours
+            position = (self.iface.getMyNodeInfo() or {}).get('position', {})
+            if position.get('latitude') and position.get('longitude'):
+                self.current_position['lat'] = position['latitude']
+                self.current_position['lon'] = position['longitude']
+                if position.get('altitude') is not None:
+                    self.current_position['alt'] = float(position['altitude'])
+            return
+        
         try:
-            # Get the nodes table and find our own node
-            nodes = self.get_nodes()
+            # Get the nodes table (unless the caller has it) and find our own node
+            if nodes is None:
+                nodes = self.get_nodes()
             if nodes:
                 for node in nodes:
                     # Look for our own node by ID/AKA or by "now" timestamp
@@ -125,72 +228,120 @@ class LiveMeshtasticLogger:
                         is_our_node = (since and ('now' in since.lower() or 'sec ago' in since.lower()))
                     
                     if is_our_node and node.get('latitude') and node.get('longitude'):
-                        lat = node.get('latitude', '')
-                        lon = node.get('longitude', '')
-                        alt = node.get('altitude', '')
+                        lat = clean_value(node.get('latitude'))
+                        lon = clean_value(node.get('longitude'))
+                        alt = clean_value(node.get('altitude'))
                         
-                        if lat and lat != 'N/A':
-                            self.current_position['lat'] = float(lat.replace('°', ''))
-                        if lon and lon != 'N/A':
-                            self.current_position['lon'] = float(lon.replace('°', ''))
-                        if alt and alt != 'N/A':
-                            self.current_position['alt'] = float(alt.replace('m', ''))
+                        if lat:
+                            self.current_position['lat'] = float(lat)
+                        if lon:
+                            self.current_position['lon'] = float(lon)
+                        if alt:
+                            self.current_position['alt'] = float(alt)
                         break
         except Exception:
             pass  # Silently handle errors
     
-    def update_position(self):
+    def update_position(self, nodes=None):
         """Update our current position from available sources"""
-        # Try GPS first, then Meshtastic device
-        if self.gps_serial:
-            self.get_gps_position()
-        else:
-            self.get_meshtastic_position()
+        # The GPS thread handles position when a GPS is attached
+        if not self.gps_serial:
+            self.get_meshtastic_position(nodes)
+    
+    def get_position(self):
+        """Return a consistent copy of our current position"""
+        with self._pos_lock:
+            return dict(self.current_position)
     
     def stop(self, signum=None, frame=None):
-        """Stop logging"""
+        """Stop logging; the main loop notices and shuts down cleanly"""
+        # Only a plain flag here: a signal handler must not take locks the
+        # interrupted main thread may be holding (Event.set would)
         self.running = False
+    
+    def pause(self, seconds):
+        """Sleep up to seconds, returning early once stop() is called"""
+        end = time.monotonic() + seconds
+        while self.running and time.monotonic() < end:
+            time.sleep(min(STOP_POLL_SECONDS, max(0, end - time.monotonic())))
+    
+    def close(self):
+        """Flush buffered rows and release the ports"""
+        if self.iface:
+            self.iface.close()  # No more on_receive callbacks after this
         if self.gps_serial:
+            self._gps_thread.join(timeout=2)
             self.gps_serial.close()
+        with self.lock:
+            self.flush_csv()
+            os.close(self._csv_fd)
         print("\n\nStopping logger...")
         print(f"Total unique nodes seen: {len(self.seen_nodes)}")
-        sys.exit(0)
-    
-    def clear_screen(self):
-        """Clear terminal screen"""
-        os.system('clear' if os.name == 'posix' else 'cls')
     
     def get_nodes(self):
-        """Get node data from meshtastic CLI"""
+        """Get node data from the library session or the meshtastic CLI"""
+        if self.iface:
+            # The interface keeps its node DB current from received packets
+            return [self.node_from_api(node) for node in list((self.iface.nodes or {}).values())]
+        
         try:
             cmd = ["/home/dwblair/gitwork/sx126x-circuitpython/myenv/bin/meshtastic", "--nodes"]
             if self.port:
                 cmd.extend(["--port", self.port])
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+            # Stream the table and parse rows as they arrive
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=1 << 16)
+            timer = threading.Timer(10, proc.kill)  # Same 10s limit the CLI always had
+            timer.start()
+            try:
+                nodes = self.parse_table_output(proc.stdout)
+            finally:
+                timer.cancel()
+                proc.stdout.close()
             
-            if result.returncode == 0:
-                return self.parse_table_output(result.stdout)
+            if proc.wait() == 0:
+                return nodes
         except Exception as e:
             print(f"Error: {e}")
+            self._prev_frame = []  # The message moved the screen; repaint in full
         return None
     
+    def node_from_api(self, node):
+        """Convert a library node DB entry to the same shape parse_table_output returns"""
+        user = node.get('user', {})
+        position = node.get('position', {})
+        last_heard = node.get('lastHeard')
+        
+        return {
+            'num': str(node.get('num', '')),
+            'user': sys.intern(user.get('longName', '')),
+            'id': user.get('id', ''),
+            'aka': sys.intern(user.get('shortName', '')),
+            'hardware': sys.intern(user.get('hwModel', '')),
+            'latitude': str(position['latitude']) if 'latitude' in position else None,
+            'longitude': str(position['longitude']) if 'longitude' in position else None,
+            'altitude': str(position['altitude']) if 'altitude' in position else None,
+            'snr': str(node['snr']) if 'snr' in node else None,
+            'last_heard': datetime.fromtimestamp(last_heard).strftime('%Y-%m-%d %H:%M:%S') if last_heard else None,
+            'since': None
+        }
+    
     def parse_table_output(self, output):
-        """Parse the table output from meshtastic --nodes"""
+        """Parse the table output from meshtastic --nodes, given as an iterable of byte lines"""
         nodes = []
-        lines = output.strip().split('\n')
         
-        for line in lines:
-            if line.startswith('│') and not line.startswith('╒') and not line.startswith('╞') and not line.startswith('╘'):
-                parts = [p.strip() for p in line.split('│')[1:-1]]
+        for line in output:
+            # Only data rows start with a numeric "N" cell; borders and the header fail here
+            if DATA_LINE.match(line):
+                parts = [p.strip() for p in line.decode('utf-8', errors='replace').split('│')[1:-1]]
                 
-                if len(parts) >= 17 and parts[0].isdigit():
+                if len(parts) >= 17:
                     node = {
                         'num': parts[0],
-                        'user': parts[1],
+                        'user': sys.intern(parts[1]),
                         'id': parts[2],
-                        'aka': parts[3],
-                        'hardware': parts[4],
+                        'aka': sys.intern(parts[3]),
+                        'hardware': sys.intern(parts[4]),
                         'latitude': parts[7] if parts[7] != 'N/A' else None,
                         'longitude': parts[8] if parts[8] != 'N/A' else None,
                         'altitude': parts[9] if parts[9] != 'N/A' else None,
@@ -202,26 +353,21 @@ class LiveMeshtasticLogger:
         
         return nodes
     
-    def log_node(self, node):
+    def log_node(self, node, timestamp=None):
         """Log a single node to CSV"""
-        timestamp = datetime.now().isoformat()
+        if timestamp is None:
+            timestamp = datetime.now().isoformat()
+        position = self.get_position()
         
         # Clean up coordinate values
-        lat = node.get('latitude', '')
-        lon = node.get('longitude', '')
-        alt = node.get('altitude', '')
+        lat = clean_value(node.get('latitude'))
+        lon = clean_value(node.get('longitude'))
+        alt = clean_value(node.get('altitude'))
         
-        if lat and lat != 'N/A':
-            lat = lat.replace('°', '')
-        if lon and lon != 'N/A':
-            lon = lon.replace('°', '')
-        if alt and alt != 'N/A':
-            alt = alt.replace('m', '')
-        
-        # Clean up SNR value
-        snr = node.get('snr', '')
-        if snr and snr != 'N/A':
-            snr = snr.replace(' dB', '')
+        # Clean up SNR value ("5.25 dB" -> "5.25")
+        snr = node.get('snr') or ''
+        if snr != 'N/A':
+            snr = snr.partition(' ')[0]
         
         row = [
             timestamp,
@@ -234,22 +380,40 @@ class LiveMeshtasticLogger:
             '',  # rssi not in table output
             snr,
             node.get('hardware', ''),
-            self.current_position.get('lat', ''),
-            self.current_position.get('lon', ''),
-            self.current_position.get('alt', '')
+            position['lat'] if position['lat'] is not None else '',
+            position['lon'] if position['lon'] is not None else '',
+            position['alt'] if position['alt'] is not None else ''
         ]
         
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
+        # Names are the only fields that can need quoting; hand those rows to csv
+        if any(',' in f or '"' in f for f in row[1:4] + row[9:10]):
+            self._row_buf.append(self.quote_row(row))
+        else:
+            self._row_buf.append(ROW_FORMAT % tuple(row))
+    
+    def quote_row(self, row):
+        """Format a row with the csv module, quoting fields as needed"""
+        self._quote_io.seek(0)
+        self._quote_io.truncate()
+        self._quote_writer.writerow(row)
+        return self._quote_io.getvalue()
+    
+    def flush_csv(self):
+        """Write buffered rows to the CSV in one go"""
+        if self._row_buf:
+            write_all(self._csv_fd, ''.join(self._row_buf).encode('utf-8'))
+            self._row_buf.clear()
     
     def update_seen_nodes(self, nodes):
         """Update the seen nodes tracker"""
         current_time = datetime.now()
+        timestamp = current_time.isoformat()  # Shared by every row in this batch
         
         for node in nodes:
             node_id = node.get('id')
             if node_id and node.get('snr'):
+                # Re-insert so dict order stays sorted by last_seen
+                self.seen_nodes.pop(node_id, None)
                 self.seen_nodes[node_id] = {
                     'user': node.get('user', 'Unknown'),
                     'aka': node.get('aka', ''),
@@ -260,92 +424,135 @@ class LiveMeshtasticLogger:
                     'last_seen': current_time,
                     'last_heard': node.get('last_heard', '')
                 }
-                self.log_node(node)
+                
+                # Only log a row when the node was heard again or moved
+                fp = (node.get('snr'), node.get('latitude'), node.get('longitude'),
+                      node.get('altitude'), node.get('last_heard'))
+                if self._last_fp.get(node_id) != fp:
+                    self._last_fp[node_id] = fp
+                    self.log_node(node, timestamp)
+        
+        # Drop the least recently seen nodes (the front of the dict) past the cap
+        while len(self.seen_nodes) > MAX_SEEN_NODES:
+            oldest = next(iter(self.seen_nodes))
+            del self.seen_nodes[oldest]
+            self._last_fp.pop(oldest, None)
+        
+        self.flush_csv()
     
     def display_nodes(self):
         """Display unique nodes in terminal"""
-        self.clear_screen()
+        position = self.get_position()
+        now = datetime.now()
         
-        print("🚗 Live Meshtastic Node Logger")
-        print("=" * 110)
-        print(f"CSV Log: {self.csv_file}")
-        print(f"Unique Nodes Seen: {len(self.seen_nodes)}")
-        print(f"Last Update: {datetime.now().strftime('%H:%M:%S')}")
+        # Build the whole screen, then draw it with one write
+        lines = [self._header]
+        lines.append(f"Unique Nodes Seen: {len(self.seen_nodes)}")
+        lines.append(f"Last Update: {now.strftime('%H:%M:%S')}")
         
         # Show our current position
-        if self.current_position['lat'] and self.current_position['lon']:
-            print(f"📍 Our Location: {self.current_position['lat']:.6f}, {self.current_position['lon']:.6f}", end="")
-            if self.current_position['alt']:
-                print(f", Alt: {self.current_position['alt']:.1f}m")
-            else:
-                print()
+        if position['lat'] and position['lon']:
+            location = f"📍 Our Location: {position['lat']:.6f}, {position['lon']:.6f}"
+            if position['alt']:
+                location += f", Alt: {position['alt']:.1f}m"
+            lines.append(location)
         else:
-            print("📍 Our Location: GPS not available")
+            lines.append("📍 Our Location: GPS not available")
         
-        print("\nPress Ctrl+C to stop")
-        print("=" * 110)
+        lines.append("\nPress Ctrl+C to stop")
+        lines.append("=" * 110)
         
         if not self.seen_nodes:
-            print("\nNo nodes detected yet...")
-            return
-        
-        # Sort by last seen time (most recent first)
-        sorted_nodes = sorted(
-            self.seen_nodes.items(), 
-            key=lambda x: x[1]['last_seen'], 
-            reverse=True
-        )
-        
-        print(f"\n{'ID':<12} {'Name':<20} {'Hardware':<18} {'SNR':<8} {'Last Seen':<12} {'Node Location':<20} {'Our Location':<20}")
-        print("-" * 110)
-        
-        for node_id, data in sorted_nodes:
-            # Calculate time since last seen
-            time_diff = datetime.now() - data['last_seen']
-            if time_diff.seconds < 60:
-                last_seen = f"{time_diff.seconds}s ago"
-            elif time_diff.seconds < 3600:
-                last_seen = f"{time_diff.seconds//60}m ago"
-            else:
-                last_seen = f"{time_diff.seconds//3600}h ago"
+            lines.append("\nNo nodes detected yet...")
+        else:
+            # Most recently seen first; seen_nodes is kept in last_seen order
+            sorted_nodes = reversed(self.seen_nodes.items())
             
-            # Format node location
-            node_location = ""
-            if data['latitude'] and data['longitude']:
-                node_location = f"{data['latitude'][:8]},{data['longitude'][:8]}"
+            lines.append(TABLE_HEADER)
+            lines.append("-" * 110)
             
             # Format our location
             our_location = ""
-            if self.current_position['lat'] and self.current_position['lon']:
-                our_location = f"{self.current_position['lat']:.4f},{self.current_position['lon']:.4f}"
+            if position['lat'] and position['lon']:
+                our_location = f"{position['lat']:.4f},{position['lon']:.4f}"
             
-            # Clean SNR for display
-            snr = data['snr'].replace(' dB', '') if data['snr'] else 'N/A'
-            
-            print(f"{node_id:<12} {data['user'][:19]:<20} {data['hardware'][:17]:<18} {snr:<8} {last_seen:<12} {node_location:<20} {our_location:<20}")
+            for node_id, data in sorted_nodes:
+                # Calculate time since last seen
+                time_diff = now - data['last_seen']
+                if time_diff.seconds < 60:
+                    last_seen = f"{time_diff.seconds}s ago"
+                elif time_diff.seconds < 3600:
+                    last_seen = f"{time_diff.seconds//60}m ago"
+                else:
+                    last_seen = f"{time_diff.seconds//3600}h ago"
+                
+                # Format node location
+                node_location = ""
+                if data['latitude'] and data['longitude']:
+                    node_location = f"{data['latitude'][:8]},{data['longitude'][:8]}"
+                
+                # Clean SNR for display
+                snr = data['snr'].partition(' ')[0] if data['snr'] else 'N/A'
+                
+                lines.append(f"{node_id:<12} {data['user'][:19]:<20} {data['hardware'][:17]:<18} {snr:<8} {last_seen:<12} {node_location:<20} {our_location:<20}")
+        
+        frame = "\n".join(lines).split("\n")
+        
+        # Row addressing only works while every line sits on its own screen row
+        term = shutil.get_terminal_size()
+        fits = len(frame) < term.lines and all(len(line) <= term.columns for line in frame)
+        
+        if not fits or len(frame) != len(self._prev_frame):
+            # Layout changed (e.g. a new node) or lines wrap/scroll: repaint everything
+            out = CLEAR_SCREEN + "\n".join(frame) + "\n"
+        else:
+            # Same layout: rewrite only the rows that changed, then park the cursor below
+            out = "".join(
+                f"\x1b[{row};1H{line}\x1b[K"
+                for row, (line, old) in enumerate(zip(frame, self._prev_frame), 1)
+                if line != old
+            )
+            if out:
+                out += f"\x1b[{len(frame) + 1};1H"
+        self._prev_frame = frame
+        
+        if out:
+            sys.stdout.write(out)
+            sys.stdout.flush()
     
     def run(self, interval=10):
         """Main loop"""
         print("Starting Live Meshtastic Logger...")
-        time.sleep(2)  # Brief pause before starting
+        self.pause(2)  # Brief pause before starting
+        
+        if self.iface:
+            # Start from the node DB; after this on_receive logs nodes as packets arrive
+            with self.lock:
+                self.update_seen_nodes(self.get_nodes())
         
         while self.running:
             try:
+                # One CLI call per poll serves both our position and the node list
+                nodes = None if self.iface else self.get_nodes()
+                
                 # Update our position
-                self.update_position()
+                self.update_position(nodes)
                 
-                nodes = self.get_nodes()
                 if nodes:
-                    self.update_seen_nodes(nodes)
+                    with self.lock:
+                        self.update_seen_nodes(nodes)
                 
-                self.display_nodes()
-                time.sleep(interval)
+                with self.lock:
+                    self.display_nodes()
                 
-            except KeyboardInterrupt:
-                break
             except Exception as e:
                 print(f"Loop error: {e}")
-                time.sleep(interval)
+                self._prev_frame = []  # The message moved the screen; repaint in full
+            
+            self.pause(interval)
+        
+        self._shutdown.set()
+        self.close()
 
 if __name__ == "__main__":
     import argparse
@@ -8,7 +8,52 @@ import json
 import argparse
 from datetime import datetime
 from pathlib import Path
-import statistics
+import html
+from operator import itemgetter
+from collections import defaultdict
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Fields analyze_session reads from every contact, fetched in one call
+CONTACT_FIELDS = itemgetter(
+    "node_id", "timestamp", "rssi", "snr", "latitude", "longitude",
+    "altitude", "short_name", "long_name", "hw_model"
+)
+
+KML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+    <name>Meshtastic Contacts</name>
+    <description>Logged Meshtastic node contacts</description>
+    <Style id="nodeStyle">
+        <IconStyle>
+            <Icon>
+                <href>http://maps.google.com/mapfiles/kml/pushpin/red-pushpin.png</href>
+            </Icon>
+        </IconStyle>
+    </Style>
+"""
+
+KML_PLACEMARK = """    <Placemark>
+        <name>{name} ({node_id})</name>
+        <description>
+            Long Name: {long_name}
+            RSSI: {rssi} dBm
+            SNR: {snr} dB
+            Time: {timestamp}
+        </description>
+        <styleUrl>#nodeStyle</styleUrl>
+        <Point>
+            <coordinates>{lon},{lat},{alt}</coordinates>
+        </Point>
+    </Placemark>
+"""
+
+KML_FOOTER = """</Document>
+</kml>"""
 
 class MeshtasticAnalyzer:
     def __init__(self, json_log="meshtastic_contacts.json"):
@@ -19,14 +64,35 @@ class MeshtasticAnalyzer:
     def load_data(self):
         """Load JSON log data"""
         try:
-            with open(self.json_log, 'r') as f:
-                self.data = json.load(f)
+            with open(self.json_log, 'rb') as f:
+                self.data = json_loads(f.read())
         except FileNotFoundError:
             print(f"Log file {self.json_log} not found")
             self.data = {"sessions": []}
         except json.JSONDecodeError:
             print(f"Error parsing {self.json_log}")
             self.data = {"sessions": []}
+        
+        # Contacts of a session still being logged live in the JSON Lines sidecar
+        contacts = []
+        try:
+            with open(Path(self.json_log).with_suffix(".jsonl"), 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        contacts.append(json_loads(line))
+                    except ValueError:
+                        continue  # The logger may be mid-write; skip the torn line
+        except FileNotFoundError:
+            pass
+        
+        if contacts:
+            self.data["sessions"].append({
+                "start_time": contacts[0]["timestamp"],
+                "active": True,
+                "contacts": contacts
+            })
     
     def analyze_session(self, session_index=-1):
         """Analyze a specific session"""
@@ -41,35 +107,29 @@ class MeshtasticAnalyzer:
             print("No contacts in this session")
             return
         
-        # Get unique nodes
-        unique_nodes = {}
+        # Get unique nodes in a single pass over the contacts
+        unique_nodes = defaultdict(lambda: {
+            "rssi_values": [],
+            "snr_values": [],
+            "positions": []
+        })
         for contact in contacts:
-            node_id = contact["node_id"]
-            if node_id not in unique_nodes:
-                unique_nodes[node_id] = {
-                    "first_seen": contact["timestamp"],
-                    "last_seen": contact["timestamp"],
-                    "name": contact["short_name"],
-                    "long_name": contact["long_name"],
-                    "hw_model": contact["hw_model"],
-                    "rssi_values": [],
-                    "snr_values": [],
-                    "positions": []
-                }
-            
-            unique_nodes[node_id]["last_seen"] = contact["timestamp"]
+            node_id, timestamp, rssi, snr, lat, lon, alt, name, long_name, hw_model = CONTACT_FIELDS(contact)
+            node_data = unique_nodes[node_id]
             
-            if contact["rssi"] is not None:
-                unique_nodes[node_id]["rssi_values"].append(contact["rssi"])
-            if contact["snr"] is not None:
-                unique_nodes[node_id]["snr_values"].append(contact["snr"])
+            if "first_seen" not in node_data:
+                node_data["first_seen"] = timestamp
+                node_data["name"] = name
+                node_data["long_name"] = long_name
+                node_data["hw_model"] = hw_model
+            node_data["last_seen"] = timestamp
             
-            if contact["latitude"] and contact["longitude"]:
-                unique_nodes[node_id]["positions"].append({
-                    "lat": contact["latitude"],
-                    "lon": contact["longitude"],
-                    "alt": contact["altitude"]
-                })
+            if rssi is not None:
+                node_data["rssi_values"].append(rssi)
+            if snr is not None:
+                node_data["snr_values"].append(snr)
+            if lat and lon:
+                node_data["positions"].append({"lat": lat, "lon": lon, "alt": alt})
         
         # Print session summary
         print("\n" + "=" * 60)
@@ -93,16 +153,18 @@ class MeshtasticAnalyzer:
             print(f"   First Seen: {node_data['first_seen']}")
             print(f"   Last Seen: {node_data['last_seen']}")
             
-            if node_data["rssi_values"]:
-                avg_rssi = statistics.mean(node_data["rssi_values"])
-                max_rssi = max(node_data["rssi_values"])
-                min_rssi = min(node_data["rssi_values"])
+            rssi_values = node_data["rssi_values"]
+            if rssi_values:
+                avg_rssi = sum(rssi_values) / len(rssi_values)
+                max_rssi = max(rssi_values)
+                min_rssi = min(rssi_values)
                 print(f"   RSSI: Avg={avg_rssi:.1f} dBm, Best={max_rssi} dBm, Worst={min_rssi} dBm")
             
-            if node_data["snr_values"]:
-                avg_snr = statistics.mean(node_data["snr_values"])
-                max_snr = max(node_data["snr_values"])
-                min_snr = min(node_data["snr_values"])
+            snr_values = node_data["snr_values"]
+            if snr_values:
+                avg_snr = sum(snr_values) / len(snr_values)
+                max_snr = max(snr_values)
+                min_snr = min(snr_values)
                 print(f"   SNR: Avg={avg_snr:.1f} dB, Best={max_snr} dB, Worst={min_snr} dB")
             
             if node_data["positions"]:
@@ -119,59 +181,37 @@ class MeshtasticAnalyzer:
         session = self.data["sessions"][session_index]
         contacts = session.get("contacts", [])
         
-        # Collect unique positions
-        positions = {}
-        for contact in contacts:
-            if contact["latitude"] and contact["longitude"]:
-                node_id = contact["node_id"]
-                if node_id not in positions:
-                    positions[node_id] = {
-                        "name": contact["short_name"],
-                        "long_name": contact["long_name"],
-                        "lat": contact["latitude"],
-                        "lon": contact["longitude"],
-                        "alt": contact["altitude"] or 0,
-                        "timestamp": contact["timestamp"],
-                        "rssi": contact["rssi"],
-                        "snr": contact["snr"]
-                    }
-        
-        # Create KML
-        kml_content = """<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-<Document>
-    <name>Meshtastic Contacts</name>
-    <description>Logged Meshtastic node contacts</description>
-    <Style id="nodeStyle">
-        <IconStyle>
-            <Icon>
-                <href>http://maps.google.com/mapfiles/kml/pushpin/red-pushpin.png</href>
-            </Icon>
-        </IconStyle>
-    </Style>
-"""
-        
-        for node_id, pos_data in positions.items():
-            kml_content += f"""    <Placemark>
-        <name>{pos_data['name']} ({node_id})</name>
-        <description>
-            Long Name: {pos_data['long_name']}
-            RSSI: {pos_data['rssi']} dBm
-            SNR: {pos_data['snr']} dB
-            Time: {pos_data['timestamp']}
-        </description>
-        <styleUrl>#nodeStyle</styleUrl>
-        <Point>
-            <coordinates>{pos_data['lon']},{pos_data['lat']},{pos_data['alt']}</coordinates>
-        </Point>
-    </Placemark>
-"""
-        
-        kml_content += """</Document>
-</kml>"""
+        # Latest contact with a position per node (contacts are in time order)
+        latest = {
+            contact["node_id"]: contact
+            for contact in contacts
+            if contact["latitude"] and contact["longitude"]
+        }
+        positions = {
+            node_id: {
+                "name": contact["short_name"],
+                "long_name": contact["long_name"],
+                "lat": contact["latitude"],
+                "lon": contact["longitude"],
+                "alt": contact["altitude"] or 0,
+                "timestamp": contact["timestamp"],
+                "rssi": contact["rssi"],
+                "snr": contact["snr"]
+            }
+            for node_id, contact in latest.items()
+        }
         
-        with open(output_file, 'w') as f:
-            f.write(kml_content)
+        # Stream KML straight to the file, one placemark per node
+        with open(output_file, 'w', buffering=1 << 16) as f:
+            f.write(KML_HEADER)
+            for node_id, pos_data in positions.items():
+                f.write(KML_PLACEMARK.format_map({
+                    **pos_data,
+                    "node_id": html.escape(str(node_id)),
+                    "name": html.escape(str(pos_data["name"])),
+                    "long_name": html.escape(str(pos_data["long_name"]))
+                }))
+            f.write(KML_FOOTER)
         
         print(f"\nKML file exported: {output_file}")
         print(f"Contains {len(positions)} nodes with position data")
@@ -187,30 +227,17 @@ class MeshtasticAnalyzer:
         session = self.data["sessions"][session_index]
         contacts = session.get("contacts", [])
         
-        with open(output_file, 'w', newline='') as f:
-            fieldnames = [
-                "timestamp", "node_id", "short_name", "long_name", 
-                "hw_model", "rssi", "snr", "latitude", "longitude", 
-                "altitude", "is_new_contact"
-            ]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for contact in contacts:
-                row = {
-                    "timestamp": contact["timestamp"],
-                    "node_id": contact["node_id"],
-                    "short_name": contact["short_name"],
-                    "long_name": contact["long_name"],
-                    "hw_model": contact["hw_model"],
-                    "rssi": contact["rssi"],
-                    "snr": contact["snr"],
-                    "latitude": contact["latitude"],
-                    "longitude": contact["longitude"],
-                    "altitude": contact["altitude"],
-                    "is_new_contact": contact["is_new_contact"]
-                }
-                writer.writerow(row)
+        fieldnames = (
+            "timestamp", "node_id", "short_name", "long_name", 
+            "hw_model", "rssi", "snr", "latitude", "longitude", 
+            "altitude", "is_new_contact"
+        )
+        get_row = itemgetter(*fieldnames)
+        
+        with open(output_file, 'w', newline='', buffering=1 << 20) as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(map(get_row, contacts))
         
         print(f"\nCSV file exported: {output_file}")
         print(f"Contains {len(contacts)} contact records")
@@ -224,10 +251,11 @@ class MeshtasticAnalyzer:
         total_sessions = len(self.data["sessions"])
         total_contacts = sum(len(s.get("contacts", [])) for s in self.data["sessions"])
         
-        all_nodes = set()
-        for session in self.data["sessions"]:
-            for contact in session.get("contacts", []):
-                all_nodes.add(contact["node_id"])
+        all_nodes = {
+            contact["node_id"]
+            for session in self.data["sessions"]
+            for contact in session.get("contacts", [])
+        }
         
         print(f"\nTotal Sessions: {total_sessions}")
         print(f"Total Contact Records: {total_contacts}")
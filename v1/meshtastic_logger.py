@@ -12,15 +12,77 @@ import sys
 from datetime import datetime
 from pathlib import Path
 import signal
-import re
+import hashlib
+import threading
+import os
+
+try:
+    from meshtastic.serial_interface import SerialInterface
+    from pubsub import pub
+except ImportError:
+    SerialInterface = None  # Fall back to polling the meshtastic CLI
+
+try:
+    import orjson
+    json_loads = orjson.loads
+    
+    def json_dumps(obj):
+        """Serialize obj to one compact JSON line (bytes)"""
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+except ImportError:
+    json_loads = json.loads
+    
+    def json_dumps(obj):
+        """Serialize obj to one compact JSON line (bytes)"""
+        return (json.dumps(obj, separators=(",", ":")) + "\n").encode()
+
+def extract_json(text):
+    """Return the first balanced {...} object in text, or None"""
+    start = text.find('{')
+    if start < 0:
+        return None
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
 
 class MeshtasticLogger:
+    # Longest wait between polls while the mesh is quiet (seconds)
+    MAX_INTERVAL = 60
+    
+    # Contacts buffered in the JSONL sidecar before it is flushed to disk
+    FLUSH_EVERY = 32
+    
     def __init__(self, port=None, log_file="meshtastic_contacts.log", json_log="meshtastic_contacts.json"):
         self.port = port
         self.log_file = log_file
         self.json_log = json_log
+        self.jsonl_log = str(Path(json_log).with_suffix(".jsonl"))  # Append-only contacts of the open session
         self.seen_nodes = {}  # Track seen nodes with their last update
         self.running = True
+        self._last_stdout_hash = None  # Digest of the last CLI output we parsed
+        self._last_parsed = None
+        self.iface = None  # Persistent library session, when available
+        self._wake = threading.Event()  # Set when a packet arrives
+        self._idle_factor = 1  # Poll interval multiplier, doubled on each quiet poll
         
         # Set up signal handler for graceful shutdown
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -28,18 +90,109 @@ class MeshtasticLogger:
         
         # Initialize log files
         self.init_logs()
+        self._json_data = self.load_json()  # Sessions envelope, kept in memory for the run
+        self._contacts = []  # Contacts of the current session
+        self._jsonl_fh = open(self.jsonl_log, 'ab', buffering=1 << 16)
+        
+        self.connect()
+    
+    def connect(self):
+        """Open a persistent session with the node instead of spawning the CLI each poll"""
+        if SerialInterface is None:
+            print("meshtastic library not installed - polling the meshtastic CLI instead")
+            return
+        
+        try:
+            self.iface = SerialInterface(devPath=self.port)
+            pub.subscribe(self.on_receive, "meshtastic.receive")
+        except Exception as e:
+            print(f"Could not open meshtastic session ({e}) - polling the meshtastic CLI instead")
+            self.iface = None
+    
+    def on_receive(self, packet, interface):
+        """Wake the main loop as soon as the node hears a packet"""
+        self._wake.set()
     
     def init_logs(self):
         """Initialize log files with headers"""
-        if not Path(self.log_file).exists():
-            with open(self.log_file, 'w') as f:
-                f.write("=== Meshtastic Contact Logger ===\n")
-                f.write(f"Started: {datetime.now().isoformat()}\n")
-                f.write("=" * 50 + "\n\n")
+        # Text log stays open for the whole run; an empty file gets the header
+        self._log_fh = open(self.log_file, 'a', buffering=1 << 16)
+        if self._log_fh.tell() == 0:
+            self._log_fh.write(
+                "=== Meshtastic Contact Logger ===\n"
+                f"Started: {datetime.now().isoformat()}\n"
+                + "=" * 50 + "\n\n"
+            )
         
         if not Path(self.json_log).exists():
             with open(self.json_log, 'w') as f:
                 json.dump({"sessions": []}, f)
+        
+        # Recover contacts left behind by a run that never reached shutdown
+        self.rebuild_json()
+    
+    def rebuild_json(self):
+        """Fold a JSON Lines sidecar left by an interrupted run into the sessions envelope"""
+        contacts = []
+        try:
+            with open(self.jsonl_log, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        contacts.append(json_loads(line))
+                    except ValueError:
+                        continue  # Torn by a crash mid-write; keep the rest
+        except FileNotFoundError:
+            return
+        
+        if not contacts:
+            # Nothing worth keeping, but don't let new records append onto a fragment
+            open(self.jsonl_log, 'w').close()
+            return
+        
+        json_data = self.load_json()
+        json_data["sessions"].append({
+            "start_time": contacts[0]["timestamp"],
+            "active": False,
+            "end_time": contacts[-1]["timestamp"],
+            "contacts": contacts
+        })
+        self.write_json(json_data)
+        
+        # Sidecar is now part of the envelope; start the next session empty
+        open(self.jsonl_log, 'w').close()
+    
+    def load_json(self):
+        """Read the sessions envelope from disk"""
+        try:
+            with open(self.json_log, 'rb') as f:
+                return json_loads(f.read())
+        except:
+            return {"sessions": []}
+    
+    def write_json(self, json_data):
+        """Atomically replace the sessions envelope on disk"""
+        tmp_path = self.json_log + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(json_dumps(json_data))
+        os.replace(tmp_path, self.json_log)
+    
+    def close_session(self):
+        """Write the in-memory session into the envelope and clear the sidecar"""
+        self._log_fh.close()
+        self._jsonl_fh.close()
+        
+        if self._contacts:
+            self._json_data["sessions"].append({
+                "start_time": self._contacts[0]["timestamp"],
+                "active": False,
+                "end_time": datetime.now().isoformat(),
+                "contacts": self._contacts
+            })
+            self.write_json(self._json_data)
+        
+        open(self.jsonl_log, 'w').close()
     
     def signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
@@ -48,7 +201,11 @@ class MeshtasticLogger:
         sys.exit(0)
     
     def get_node_info(self):
-        """Get current node information from meshtastic CLI"""
+        """Get current node information from the library session or the meshtastic CLI"""
+        if self.iface:
+            # The interface keeps its node DB current from received packets
+            return {"nodes": list((self.iface.nodes or {}).values())}
+        
         try:
             # Build command
             cmd = ["meshtastic", "--nodes", "--output", "json"]
@@ -62,16 +219,24 @@ class MeshtasticLogger:
                 print(f"Error running meshtastic command: {result.stderr}")
                 return None
             
+            # Node table unchanged since last poll - reuse the parsed result
+            stdout_hash = hashlib.blake2b(result.stdout.encode(), digest_size=8).digest()
+            if stdout_hash == self._last_stdout_hash:
+                return self._last_parsed
+            
             # Parse JSON output
             try:
-                data = json.loads(result.stdout)
-                return data
+                data = json_loads(result.stdout)
             except json.JSONDecodeError:
                 # Sometimes the output isn't pure JSON, try to extract it
-                json_match = re.search(r'\{.*\}', result.stdout, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-                return None
+                json_text = extract_json(result.stdout)
+                if not json_text:
+                    return None
+                data = json_loads(json_text)
+            
+            self._last_stdout_hash = stdout_hash
+            self._last_parsed = data
+            return data
                 
         except subprocess.TimeoutExpired:
             print("Command timeout - node might be busy")
@@ -157,45 +322,35 @@ class MeshtasticLogger:
             "last_heard": node_info["lastHeard"]
         }
         
-        # Write to text log
-        with open(self.log_file, 'a') as f:
-            if is_new:
-                f.write(f"*** NEW CONTACT ***\n")
-            f.write(f"Timestamp: {timestamp}\n")
-            f.write(f"Node ID: {node_id}\n")
-            f.write(f"Name: {node_info['shortName']} ({node_info['longName']})\n")
-            f.write(f"Hardware: {node_info['hwModel']}\n")
-            f.write(f"Signal: RSSI={node_info['rssi']} dBm, SNR={node_info['snr']} dB\n")
-            
-            if node_info["latitude"] and node_info["longitude"]:
-                f.write(f"Position: {node_info['latitude']:.6f}, {node_info['longitude']:.6f}")
-                if node_info["altitude"]:
-                    f.write(f", Alt: {node_info['altitude']}m")
-                f.write("\n")
-            else:
-                f.write("Position: Not available\n")
-            
-            f.write("-" * 40 + "\n\n")
-        
-        # Write to JSON log
-        try:
-            with open(self.json_log, 'r') as f:
-                json_data = json.load(f)
-        except:
-            json_data = {"sessions": []}
+        # Write to text log as one block
+        parts = ["*** NEW CONTACT ***\n"] if is_new else []
+        parts.append(
+            f"Timestamp: {timestamp}\n"
+            f"Node ID: {node_id}\n"
+            f"Name: {node_info['shortName']} ({node_info['longName']})\n"
+            f"Hardware: {node_info['hwModel']}\n"
+            f"Signal: RSSI={node_info['rssi']} dBm, SNR={node_info['snr']} dB\n"
+        )
         
-        # Find or create current session
-        if not json_data["sessions"] or not json_data["sessions"][-1].get("active"):
-            json_data["sessions"].append({
-                "start_time": timestamp,
-                "active": True,
-                "contacts": []
-            })
+        if node_info["latitude"] and node_info["longitude"]:
+            parts.append(f"Position: {node_info['latitude']:.6f}, {node_info['longitude']:.6f}")
+            if node_info["altitude"]:
+                parts.append(f", Alt: {node_info['altitude']}m")
+            parts.append("\n")
+        else:
+            parts.append("Position: Not available\n")
         
-        json_data["sessions"][-1]["contacts"].append(log_entry)
+        parts.append("-" * 40 + "\n\n")
+        self._log_fh.write("".join(parts))
         
-        with open(self.json_log, 'w') as f:
-            json.dump(json_data, f, indent=2)
+        # Keep the session in memory; the sidecar is only a crash journal.
+        # Both log handles are flushed in batches of FLUSH_EVERY contacts,
+        # and again by run() at the end of every poll
+        self._contacts.append(log_entry)
+        self._jsonl_fh.write(json_dumps(log_entry))
+        if len(self._contacts) % self.FLUSH_EVERY == 0:
+            self._jsonl_fh.flush()
+            self._log_fh.flush()
         
         # Print to console
         if is_new:
@@ -218,42 +373,55 @@ class MeshtasticLogger:
         print("\nPress Ctrl+C to stop\n")
         print("=" * 50)
         
-        while self.running:
-            try:
-                # Get current node information
-                node_data = self.get_node_info()
-                
-                if node_data:
-                    nodes = self.parse_node_data(node_data)
+        try:
+            while self.running:
+                try:
+                    # Get current node information
+                    node_data = self.get_node_info()
+                    changed = 0
                     
-                    # Log each node
-                    for node in nodes:
-                        # Skip nodes without ID or the local node
-                        if node["id"] and node["id"] != "unknown":
-                            # Only log if we have signal data (indicates actual contact)
-                            if node["rssi"] is not None or node["snr"] is not None:
-                                self.log_node(node)
-                
-                # Wait before next poll
-                time.sleep(interval)
-                
-            except KeyboardInterrupt:
-                break
+                    if node_data:
+                        nodes = self.parse_node_data(node_data)
+                        
+                        # Log each node that is new or changed since the last poll
+                        for node in nodes:
+                            # Skip nodes without ID or the local node
+                            if node["id"] and node["id"] != "unknown":
+                                # Only log if we have signal data (indicates actual contact)
+                                if node["rssi"] is not None or node["snr"] is not None:
+                                    if self.seen_nodes.get(node["id"], {}).get("info") != node:
+                                        changed += 1
+                                        self.log_node(node)
+                    
+                    # Don't leave a quiet poll's contacts sitting in the buffers
+                    if changed:
+                        self._jsonl_fh.flush()
+                        self._log_fh.flush()
+                    
+                    # Back off while nothing changes, poll at the base rate while it does
+                    if changed:
+                        self._idle_factor = 1
+                    else:
+                        self._idle_factor = min(self._idle_factor * 2, max(1, self.MAX_INTERVAL // interval))
+                    
+                    # Wait before next poll, or until a packet arrives
+                    if self._wake.wait(interval * self._idle_factor):
+                        self._idle_factor = 1
+                    self._wake.clear()
+                    
+                except KeyboardInterrupt:
+                    break
+                except Exception as e:
+                    print(f"Error in main loop: {e}")
+                    time.sleep(interval)
+        finally:
+            # Close out the session (also reached via sys.exit in the signal handler)
+            if self.iface:
+                self.iface.close()
+            try:
+                self.close_session()
             except Exception as e:
-                print(f"Error in main loop: {e}")
-                time.sleep(interval)
-        
-        # Mark session as inactive
-        try:
-            with open(self.json_log, 'r') as f:
-                json_data = json.load(f)
-            if json_data["sessions"] and json_data["sessions"][-1].get("active"):
-                json_data["sessions"][-1]["active"] = False
-                json_data["sessions"][-1]["end_time"] = datetime.now().isoformat()
-                with open(self.json_log, 'w') as f:
-                    json.dump(json_data, f, indent=2)
-        except:
-            pass
+                print(f"Error writing session to {self.json_log}: {e}")
         
         print(f"\n\nLogging session ended")
         print(f"Total unique contacts: {len(self.seen_nodes)}")
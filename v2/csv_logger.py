@@ -11,17 +11,56 @@ import time
 import sys
 from datetime import datetime
 import signal
+import atexit
+import threading
+
+try:
+    from meshtastic.serial_interface import SerialInterface
+    from pubsub import pub
+except ImportError:
+    SerialInterface = None  # Fall back to scraping the meshtastic CLI
+
+# Fixed-schema CSV row; names are passed through CSV_SAFE so no field needs quoting
+ROW_FORMAT = "{},{},{},{},{},{},{},{},{},{}\r\n"  # csv.writer's default line terminator
+CSV_SAFE = str.maketrans({',': ';', '"': "'", '\n': ' ', '\r': ' '})
+
+def csv_value(value):
+    """Format a possibly-missing value the way csv.writer would"""
+    return '' if value is None else value
 
 class SimpleMeshtasticLogger:
     def __init__(self, port=None, csv_file="log.csv"):
         self.port = port
         self.csv_file = csv_file
         self.running = True
+        self.iface = None  # Persistent library session, when available
+        self._wake = threading.Event()  # Set when a packet arrives
+        self._last_sig = {}  # node id -> fields seen at its last logged row
         
         signal.signal(signal.SIGINT, self.stop)
         signal.signal(signal.SIGTERM, self.stop)
         
         self.init_csv()
+        self._csv_fp = open(self.csv_file, 'a', newline='', buffering=1 << 20, encoding='utf-8')
+        atexit.register(self._csv_fp.close)  # Flush buffered rows on any exit
+        self.connect()
+    
+    def connect(self):
+        """Open a persistent session with the node instead of spawning the CLI each poll"""
+        if SerialInterface is None:
+            print("meshtastic library not installed - polling the meshtastic CLI instead")
+            return
+        
+        try:
+            self.iface = SerialInterface(devPath=self.port)
+            pub.subscribe(self.on_receive, "meshtastic.receive")
+        except Exception as e:
+            print(f"Could not open meshtastic session ({e}) - polling the meshtastic CLI instead")
+            self.iface = None
+    
+    def on_receive(self, packet, interface):
+        """Wake the polling loop as soon as the node hears a packet"""
+        self._wake.set()
     
     def init_csv(self):
         """Initialize CSV file with headers"""
@@ -46,89 +85,80 @@ class SimpleMeshtasticLogger:
     def stop(self, signum=None, frame=None):
         """Stop logging"""
         self.running = False
+        if self.iface:
+            self.iface.close()
+        self._csv_fp.close()
         print("\nStopping logger...")
         sys.exit(0)
     
     def get_nodes(self):
-        """Get node data from meshtastic CLI"""
+        """Get node data from the library session or the meshtastic CLI"""
+        if self.iface:
+            # The interface keeps its node DB current from received packets
+            return [self.parse_node(node) for node in list((self.iface.nodes or {}).values())]
+        
         try:
-            cmd = ["/home/dwblair/gitwork/sx126x-circuitpython/myenv/bin/meshtastic", "--nodes"]
+            cmd = ["/home/dwblair/gitwork/sx126x-circuitpython/myenv/bin/meshtastic", "--info"]
             if self.port:
                 cmd.extend(["--port", self.port])
             
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
             
             if result.returncode == 0:
-                return self.parse_table_output(result.stdout)
+                return self.parse_info_output(result.stdout)
         except Exception as e:
             print(f"Error: {e}")
         return None
     
-    def parse_table_output(self, output):
-        """Parse the table output from meshtastic --nodes"""
-        nodes = []
-        lines = output.strip().split('\n')
-        
-        # Find the data rows (skip header and separators)
-        for line in lines:
-            if line.startswith('│') and not line.startswith('╒') and not line.startswith('╞') and not line.startswith('╘'):
-                # Split by │ and clean up
-                parts = [p.strip() for p in line.split('│')[1:-1]]  # Remove first and last empty parts
-                
-                if len(parts) >= 12 and parts[0].isdigit():  # Make sure it's a data row
-                    node = {
-                        'num': parts[0],
-                        'user': parts[1],
-                        'id': parts[2],
-                        'aka': parts[3],
-                        'hardware': parts[4],
-                        'latitude': parts[7] if parts[7] != 'N/A' else None,
-                        'longitude': parts[8] if parts[8] != 'N/A' else None,
-                        'altitude': parts[9] if parts[9] != 'N/A' else None,
-                        'snr': parts[13] if parts[13] != 'N/A' else None,
-                        'last_heard': parts[16] if parts[16] != 'N/A' else None
-                    }
-                    nodes.append(node)
+    def parse_node(self, node):
+        """Extract the fields we log from a meshtastic node DB entry"""
+        user = node.get('user', {})
+        position = node.get('position', {})
+        last_heard = node.get('lastHeard')
         
-        return nodes
+        return {
+            'num': node.get('num'),
+            'user': user.get('longName', ''),
+            'id': user.get('id', ''),
+            'aka': user.get('shortName', ''),
+            'hardware': user.get('hwModel', ''),
+            'latitude': position.get('latitude'),
+            'longitude': position.get('longitude'),
+            'altitude': position.get('altitude'),
+            'snr': node.get('snr'),
+            'last_heard': datetime.fromtimestamp(last_heard).strftime('%Y-%m-%d %H:%M:%S') if last_heard else None
+        }
     
-    def log_node(self, node):
-        """Log a single node to CSV"""
-        timestamp = datetime.now().isoformat()
+    def parse_info_output(self, output):
+        """Parse the node DB JSON printed by meshtastic --info"""
+        decoder = json.JSONDecoder()
         
-        # Clean up coordinate values
-        lat = node.get('latitude', '')
-        lon = node.get('longitude', '')
-        alt = node.get('altitude', '')
+        start = output.find('Nodes in mesh:')
+        if start < 0:
+            return []
         
-        if lat and lat != 'N/A':
-            lat = lat.replace('°', '')
-        if lon and lon != 'N/A':
-            lon = lon.replace('°', '')
-        if alt and alt != 'N/A':
-            alt = alt.replace('m', '')
-        
-        # Clean up SNR value
-        snr = node.get('snr', '')
-        if snr and snr != 'N/A':
-            snr = snr.replace(' dB', '')
+        # Decode just the nodes object; more sections follow it
+        nodes, _ = decoder.raw_decode(output, output.index('{', start))
+        return [self.parse_node(node) for node in nodes.values()]
+    
+    def log_node(self, node, timestamp):
+        """Log a single node to CSV"""
+        snr = node.get('snr')
         
-        row = [
+        row = ROW_FORMAT.format(
             timestamp,
-            node.get('id', ''),
-            node.get('aka', ''),
-            node.get('user', ''),
-            lat,
-            lon,
-            alt,
-            '',  # rssi not in table output
-            snr,
-            node.get('hardware', '')
-        ]
+            node.get('id', '').translate(CSV_SAFE),
+            node.get('aka', '').translate(CSV_SAFE),
+            node.get('user', '').translate(CSV_SAFE),
+            csv_value(node.get('latitude')),
+            csv_value(node.get('longitude')),
+            csv_value(node.get('altitude')),
+            '',  # rssi not in the node DB
+            csv_value(snr),
+            node.get('hardware', '').translate(CSV_SAFE)
+        )
         
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
+        self._csv_fp.write(row)
         
         print(f"Logged: {node.get('user', 'Unknown')} (SNR: {snr})")
     
@@ -141,11 +171,20 @@ class SimpleMeshtasticLogger:
             try:
                 nodes = self.get_nodes()
                 if nodes:
+                    timestamp = datetime.now().isoformat()  # One timestamp per poll
                     for node in nodes:
-                        if node.get("id") and node.get("snr"):
-                            self.log_node(node)
+                        if node.get("id") and node.get("snr") is not None:
+                            # Only write a row when the node was heard again or moved
+                            sig = (node.get('snr'), node.get('latitude'), node.get('longitude'),
+                                   node.get('altitude'), node.get('last_heard'))
+                            if self._last_sig.get(node['id']) != sig:
+                                self._last_sig[node['id']] = sig
+                                self.log_node(node, timestamp)
+                    self._csv_fp.flush()  # One write per poll
                 
-                time.sleep(interval)
+                # Wait before next poll, or until a packet arrives
+                self._wake.wait(interval)
+                self._wake.clear()
                 
             except KeyboardInterrupt:
                 break
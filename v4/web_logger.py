@@ -11,14 +11,44 @@ import sys
 import os
 import json
 import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import signal
+import atexit
 import serial
 import re
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, request, Response
 from flask_socketio import SocketIO, emit
 
+try:
+    from meshtastic.serial_interface import SerialInterface
+    from pubsub import pub
+except ImportError:
+    SerialInterface = None  # Fall back to scraping the meshtastic CLI
+
+try:
+    from orjson import dumps as json_dumps
+except ImportError:
+    def json_dumps(obj):
+        """Serialize obj to compact JSON (bytes)"""
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+# Fixed-schema CSV row; names are passed through CSV_SAFE so no field needs quoting
+ROW_FORMAT = "{},{},{},{},{},{},{},{},{},{},{},{},{}\r\n"  # csv.writer's default line terminator
+CSV_SAFE = str.maketrans({',': ';', '"': "'", '\n': ' ', '\r': ' '})
+
+def csv_value(value):
+    """Format a possibly-missing value the way csv.writer would"""
+    return '' if value is None else value
+
+# GGA sentence with a valid (GPS or DGPS) fix: lat, N/S, lon, E/W, altitude
+_GGA = re.compile(rb'\$G[PN]GGA,[^,]*,(\d{2})(\d{2}\.\d+),([NS]),(\d{3})(\d{2}\.\d+),([EW]),[12],[^,]*,[^,]*,(-?\d+(?:\.\d*)?)?')
+
 class WebMeshtasticLogger:
+    # Flush buffered CSV rows at most this often; the 1 MiB buffer absorbs bursts in between
+    CSV_FLUSH_SECONDS = 2.0
+    
     def __init__(self, port=None, csv_file="log.csv", gps_port=None, my_node_id=None):
         self.port = port
         self.csv_file = csv_file
@@ -26,9 +56,14 @@ class WebMeshtasticLogger:
         self.my_node_id = my_node_id
         self.running = True
         self.seen_nodes = {}  # Track unique nodes
-        self.current_position = {'lat': None, 'lon': None, 'alt': None}
+        self._position = (None, None, None)  # Our (lat, lon, alt), replaced as a whole
         self.gps_serial = None
-        self.data_lock = threading.Lock()
+        self._nmea_buf = b''  # Partial NMEA sentence left over from the last read
+        self.iface = None  # Persistent library session, when available
+        self._my_node_num = None  # Our node number, as reported by meshtastic --info
+        self._wake = threading.Event()  # Set when a packet arrives
+        self._clients = set()  # Socket.IO session ids of open map pages
+        self._last_emitted = {}  # node_id -> (lat, lon, snr) last sent to the map
         
         # Flask app setup
         self.app = Flask(__name__)
@@ -42,8 +77,35 @@ class WebMeshtasticLogger:
             self.init_gps()
         
         self.init_csv()
+        self._csv_fp = open(self.csv_file, 'a', newline='', buffering=1 << 20, encoding='utf-8')
+        atexit.register(self._csv_fp.close)  # Flush buffered rows on any exit
+        self._pending = 0  # Rows written since the last flush
+        self._last_flush = time.monotonic()
+        self._write_q = queue.SimpleQueue()  # (rows, map updates) from each poll
+        self._writer_thread = threading.Thread(target=self.write_loop, daemon=True)
+        self._writer_thread.start()
+        self._exec = ThreadPoolExecutor(max_workers=1)  # Runs node fetches alongside GPS reads
+        self.connect()
+        self.publish_data()  # /api/data body, rebuilt each poll
         self.setup_routes()
     
+    def connect(self):
+        """Open a persistent session with the node instead of spawning the CLI each poll"""
+        if SerialInterface is None:
+            print("meshtastic library not installed - polling the meshtastic CLI instead")
+            return
+        
+        try:
+            self.iface = SerialInterface(devPath=self.port)
+            pub.subscribe(self.on_receive, "meshtastic.receive")
+        except Exception as e:
+            print(f"Could not open meshtastic session ({e}) - polling the meshtastic CLI instead")
+            self.iface = None
+    
+    def on_receive(self, packet, interface):
+        """Wake the polling loop as soon as the node hears a packet"""
+        self._wake.set()
+    
     def init_csv(self):
         """Initialize CSV file with headers"""
         try:
@@ -82,81 +144,93 @@ class WebMeshtasticLogger:
             return
         
         try:
-            for _ in range(10):
-                line = self.gps_serial.readline().decode('ascii', errors='ignore').strip()
+            # Take whatever the receiver has sent since the last poll in one read
+            self._nmea_buf += self.gps_serial.read(self.gps_serial.in_waiting or 1)
+            end = self._nmea_buf.rfind(b'\n') + 1
+            sentences, self._nmea_buf = self._nmea_buf[:end], self._nmea_buf[end:]
+            
+            # Use the newest fix in the batch
+            m = None
+            for m in _GGA.finditer(sentences):
+                pass
+            if m:
+                lat_deg, lat_min, ns, lon_deg, lon_min, ew, alt = m.groups()
                 
-                if line.startswith('$GPGGA') or line.startswith('$GNGGA'):
-                    parts = line.split(',')
-                    if len(parts) > 10 and parts[6] in ['1', '2']:
-                        if parts[2] and parts[3]:
-                            lat_deg = float(parts[2][:2])
-                            lat_min = float(parts[2][2:])
-                            lat = lat_deg + lat_min/60
-                            if parts[3] == 'S':
-                                lat = -lat
-                            self.current_position['lat'] = lat
-                        
-                        if parts[4] and parts[5]:
-                            lon_deg = float(parts[4][:3])
-                            lon_min = float(parts[4][3:])
-                            lon = lon_deg + lon_min/60
-                            if parts[5] == 'W':
-                                lon = -lon
-                            self.current_position['lon'] = lon
-                        
-                        if parts[9]:
-                            self.current_position['alt'] = float(parts[9])
-                        
-                        break
+                lat = int(lat_deg) + float(lat_min)/60
+                lon = int(lon_deg) + float(lon_min)/60
+                self.set_position(-lat if ns == b'S' else lat,
+                                  -lon if ew == b'W' else lon,
+                                  alt or None)
         except Exception as e:
             pass
     
     def get_nodes(self):
-        """Get node data from meshtastic CLI"""
+        """Get node data from the library session or the meshtastic CLI"""
+        if self.iface:
+            # The interface keeps its node DB current from received packets
+            return [self.parse_node(node) for node in list((self.iface.nodes or {}).values())]
+        
         try:
-            cmd = ["/home/dwblair/gitwork/sx126x-circuitpython/myenv/bin/meshtastic", "--nodes"]
+            cmd = ["/home/dwblair/gitwork/sx126x-circuitpython/myenv/bin/meshtastic", "--info"]
             if self.port:
                 cmd.extend(["--port", self.port])
             
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
             
             if result.returncode == 0:
-                return self.parse_table_output(result.stdout)
+                return self.parse_info_output(result.stdout)
         except Exception as e:
             print(f"Error: {e}")
         return None
     
-    def parse_table_output(self, output):
-        """Parse the table output from meshtastic --nodes"""
-        nodes = []
-        lines = output.strip().split('\n')
+    def parse_node(self, node):
+        """Extract the fields we log from a meshtastic node DB entry"""
+        user = node.get('user', {})
+        position = node.get('position', {})
+        last_heard = node.get('lastHeard')
         
-        for line in lines:
-            if line.startswith('│') and not line.startswith('╒') and not line.startswith('╞') and not line.startswith('╘'):
-                parts = [p.strip() for p in line.split('│')[1:-1]]
-                
-                if len(parts) >= 17 and parts[0].isdigit():
-                    node = {
-                        'num': parts[0],
-                        'user': parts[1],
-                        'id': parts[2],
-                        'aka': parts[3],
-                        'hardware': parts[4],
-                        'latitude': parts[7] if parts[7] != 'N/A' else None,
-                        'longitude': parts[8] if parts[8] != 'N/A' else None,
-                        'altitude': parts[9] if parts[9] != 'N/A' else None,
-                        'snr': parts[13] if parts[13] != 'N/A' else None,
-                        'last_heard': parts[16] if parts[16] != 'N/A' else None,
-                        'since': parts[17] if len(parts) > 17 and parts[17] != 'N/A' else None
-                    }
-                    nodes.append(node)
+        return {
+            'num': node.get('num'),
+            'user': user.get('longName', ''),
+            'id': user.get('id', ''),
+            'aka': user.get('shortName', ''),
+            'hardware': user.get('hwModel', ''),
+            'latitude': position.get('latitude'),
+            'longitude': position.get('longitude'),
+            'altitude': position.get('altitude'),
+            'snr': node.get('snr'),
+            'last_heard': datetime.fromtimestamp(last_heard).strftime('%Y-%m-%d %H:%M:%S') if last_heard else None
+        }
+    
+    def parse_info_output(self, output):
+        """Parse the node DB JSON printed by meshtastic --info"""
+        decoder = json.JSONDecoder()
+        
+        if self.iface is None:
+            # Remember which node is ours for position tracking
+            start = output.find('My info:')
+            if start >= 0:
+                my_info, _ = decoder.raw_decode(output, output.index('{', start))
+                self._my_node_num = my_info.get('myNodeNum')
+        
+        start = output.find('Nodes in mesh:')
+        if start < 0:
+            return []
         
-        return nodes
+        # Decode just the nodes object; more sections follow it
+        nodes, _ = decoder.raw_decode(output, output.index('{', start))
+        return [self.parse_node(node) for node in nodes.values()]
     
-    def get_meshtastic_position(self):
-        """Try to get our position from the Meshtastic device"""
+    def get_meshtastic_position(self, nodes):
+        """Try to get our position from the Meshtastic device, given this poll's nodes"""
+        if self.iface and not self.my_node_id:
+            # The library knows which node is ours
+            position = (self.iface.getMyNodeInfo() or {}).get('position', {})
+            if position.get('latitude') and position.get('longitude'):
+                self.set_position(position['latitude'], position['longitude'], position.get('altitude'))
+            return
+        
         try:
-            nodes = self.get_nodes()
             if nodes:
                 for node in nodes:
                     is_our_node = False
@@ -165,118 +239,160 @@ class WebMeshtasticLogger:
                         is_our_node = (self.my_node_id.lower() in node.get('aka', '').lower() or 
                                      self.my_node_id.lower() in node.get('id', '').lower())
                     else:
-                        since = node.get('since', '')
-                        is_our_node = (since and ('now' in since.lower() or 'sec ago' in since.lower()))
+                        is_our_node = self._my_node_num is not None and node.get('num') == self._my_node_num
                     
                     if is_our_node and node.get('latitude') and node.get('longitude'):
-                        lat = node.get('latitude', '')
-                        lon = node.get('longitude', '')
-                        alt = node.get('altitude', '')
-                        
-                        if lat and lat != 'N/A':
-                            self.current_position['lat'] = float(lat.replace('°', ''))
-                        if lon and lon != 'N/A':
-                            self.current_position['lon'] = float(lon.replace('°', ''))
-                        if alt and alt != 'N/A':
-                            self.current_position['alt'] = float(alt.replace('m', ''))
+                        self.set_position(node['latitude'], node['longitude'], node.get('altitude'))
                         break
         except Exception:
             pass
     
-    def update_position(self):
-        """Update our current position from available sources"""
-        if self.gps_serial:
-            self.get_gps_position()
-        else:
-            self.get_meshtastic_position()
+    def set_position(self, lat, lon, alt=None):
+        """Replace our position in one assignment, keeping the last altitude if none is given"""
+        self._position = (lat, lon, self._position[2] if alt is None else float(alt))
     
-    def log_node(self, node):
-        """Log a single node to CSV"""
-        timestamp = datetime.now().isoformat()
-        
-        lat = node.get('latitude', '')
-        lon = node.get('longitude', '')
-        alt = node.get('altitude', '')
-        
-        if lat and lat != 'N/A':
-            lat = lat.replace('°', '')
-        if lon and lon != 'N/A':
-            lon = lon.replace('°', '')
-        if alt and alt != 'N/A':
-            alt = alt.replace('m', '')
-        
-        snr = node.get('snr', '')
-        if snr and snr != 'N/A':
-            snr = snr.replace(' dB', '')
+    def position_dict(self):
+        """Our position in the shape the map page expects"""
+        lat, lon, alt = self._position
+        return {'lat': lat, 'lon': lon, 'alt': alt}
+    
+    def csv_row(self, node, timestamp):
+        """Build the CSV row for a single node"""
+        our_lat, our_lon, our_alt = self._position
         
-        row = [
+        row = ROW_FORMAT.format(
             timestamp,
-            node.get('id', ''),
-            node.get('aka', ''),
-            node.get('user', ''),
-            lat,
-            lon,
-            alt,
+            node.get('id', '').translate(CSV_SAFE),
+            node.get('aka', '').translate(CSV_SAFE),
+            node.get('user', '').translate(CSV_SAFE),
+            csv_value(node.get('latitude')),
+            csv_value(node.get('longitude')),
+            csv_value(node.get('altitude')),
             '',
-            snr,
-            node.get('hardware', ''),
-            self.current_position.get('lat', ''),
-            self.current_position.get('lon', ''),
-            self.current_position.get('alt', '')
-        ]
+            csv_value(node.get('snr')),
+            node.get('hardware', '').translate(CSV_SAFE),
+            csv_value(our_lat),
+            csv_value(our_lon),
+            csv_value(our_alt)
+        )
         
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
+        return row
+    
+    def write_loop(self):
+        """Write queued CSV rows and push map updates off the monitoring thread"""
+        while True:
+            stopping = False
+            try:
+                try:
+                    batch = [self._write_q.get(timeout=self.CSV_FLUSH_SECONDS)]
+                except queue.Empty:
+                    if self._pending:
+                        self.flush_csv()
+                    continue
+                
+                # Coalesce everything queued since the last pass
+                while not self._write_q.empty():
+                    batch.append(self._write_q.get_nowait())
+                
+                stopping = None in batch
+                batch = [item for item in batch if item is not None]
+                
+                rows = [row for item_rows, _ in batch for row in item_rows]
+                updated_nodes = [update for _, updates in batch for update in updates]
+                
+                self._csv_fp.write(''.join(rows))
+                self._pending += len(rows)
+                if stopping or time.monotonic() - self._last_flush > self.CSV_FLUSH_SECONDS:
+                    self.flush_csv()
+                
+                # Emit updates to web clients, if any are connected
+                if updated_nodes and self._clients and not stopping:
+                    self.socketio.emit('nodes_update', {
+                        'nodes': updated_nodes,
+                        'our_position': self.position_dict()
+                    })
+            except Exception as e:
+                # Keep the writer alive; a dead thread would silently stop all logging
+                print(f"Writer error: {e}")
+            
+            if stopping:
+                return
+    
+    def flush_csv(self):
+        """Push buffered CSV rows to disk"""
+        self._csv_fp.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
     
     def update_seen_nodes(self, nodes):
         """Update the seen nodes tracker"""
         current_time = datetime.now()
+        timestamp = current_time.isoformat()  # Shared by every row and marker from this poll
+        rows = []
         updated_nodes = []
         
-        with self.data_lock:
-            for node in nodes:
-                node_id = node.get('id')
-                if node_id and node.get('snr'):
-                    is_new = node_id not in self.seen_nodes
-                    
-                    self.seen_nodes[node_id] = {
+        for node in nodes:
+            node_id = node.get('id')
+            if node_id and node.get('snr') is not None:
+                is_new = node_id not in self.seen_nodes
+                
+                # Only log nodes that were heard again or moved since the last poll
+                sig = (node.get('snr'), node.get('latitude'), node.get('longitude'),
+                       node.get('altitude'), node.get('last_heard'))
+                changed = is_new or self.seen_nodes[node_id]['_sig'] != sig
+                
+                # Build the map record once; /api/data and socket updates reuse it
+                lat = node.get('latitude')
+                lon = node.get('longitude')
+                marker = None
+                if lat and lon:
+                    marker = {
+                        'id': node_id,
                         'user': node.get('user', 'Unknown'),
-                        'aka': node.get('aka', ''),
+                        'latitude': lat,
+                        'longitude': lon,
+                        'snr': node.get('snr'),
                         'hardware': node.get('hardware', ''),
-                        'snr': node.get('snr', ''),
-                        'latitude': node.get('latitude', ''),
-                        'longitude': node.get('longitude', ''),
-                        'last_seen': current_time,
-                        'last_heard': node.get('last_heard', ''),
-                        'is_new': is_new
+                        'last_seen': timestamp
                     }
-                    
-                    self.log_node(node)
-                    
-                    # Prepare data for web update
-                    lat = node.get('latitude', '')
-                    lon = node.get('longitude', '')
-                    if lat and lon and lat != 'N/A' and lon != 'N/A':
-                        lat_val = float(lat.replace('°', ''))
-                        lon_val = float(lon.replace('°', ''))
-                        
-                        updated_nodes.append({
-                            'id': node_id,
-                            'user': node.get('user', 'Unknown'),
-                            'latitude': lat_val,
-                            'longitude': lon_val,
-                            'snr': node.get('snr', ''),
-                            'hardware': node.get('hardware', ''),
-                            'is_new': is_new
-                        })
+                
+                self.seen_nodes[node_id] = {
+                    'user': node.get('user', 'Unknown'),
+                    'aka': node.get('aka', ''),
+                    'hardware': node.get('hardware', ''),
+                    'snr': node.get('snr'),
+                    'latitude': node.get('latitude'),
+                    'longitude': node.get('longitude'),
+                    'last_seen': current_time,
+                    'last_heard': node.get('last_heard', ''),
+                    'is_new': is_new,
+                    'marker': marker,
+                    '_sig': sig
+                }
+                
+                if not changed:
+                    continue
+                
+                rows.append(self.csv_row(node, timestamp))
+                
+                # Prepare data for web update, skipping nodes the map already shows as-is
+                if marker and self._clients:
+                    shown = (lat, lon, node.get('snr'))
+                    if self._last_emitted.get(node_id) != shown:
+                        self._last_emitted[node_id] = shown
+                        updated_nodes.append(dict(marker, is_new=is_new))
         
-        # Emit updates to web clients
-        if updated_nodes:
-            self.socketio.emit('nodes_update', {
-                'nodes': updated_nodes,
-                'our_position': self.current_position
-            })
+        # CSV writes and socket emits happen on the writer thread
+        if rows:
+            self._write_q.put((rows, updated_nodes))
+    
+    def publish_data(self):
+        """Serialize the /api/data payload once per poll; requests just return the bytes"""
+        self._data_json = json_dumps({
+            'nodes': [data['marker'] for data in self.seen_nodes.values() if data['marker']],
+            'our_position': self.position_dict(),
+            'total_nodes': len(self.seen_nodes)
+        })
     
     def setup_routes(self):
         """Setup Flask routes"""
@@ -284,32 +400,17 @@ class WebMeshtasticLogger:
         def index():
             return render_template('map.html')
         
+        @self.socketio.on('connect')
+        def on_connect():
+            self._clients.add(request.sid)
+        
+        @self.socketio.on('disconnect')
+        def on_disconnect():
+            self._clients.discard(request.sid)
+        
         @self.app.route('/api/data')
         def get_data():
-            with self.data_lock:
-                nodes_data = []
-                for node_id, data in self.seen_nodes.items():
-                    lat = data.get('latitude', '')
-                    lon = data.get('longitude', '')
-                    if lat and lon and lat != 'N/A' and lon != 'N/A':
-                        lat_val = float(lat.replace('°', ''))
-                        lon_val = float(lon.replace('°', ''))
-                        
-                        nodes_data.append({
-                            'id': node_id,
-                            'user': data['user'],
-                            'latitude': lat_val,
-                            'longitude': lon_val,
-                            'snr': data['snr'],
-                            'hardware': data['hardware'],
-                            'last_seen': data['last_seen'].isoformat()
-                        })
-                
-                return jsonify({
-                    'nodes': nodes_data,
-                    'our_position': self.current_position,
-                    'total_nodes': len(self.seen_nodes)
-                })
+            return Response(self._data_json, mimetype='application/json')
     
     def monitoring_loop(self):
         """Main monitoring loop"""
@@ -317,13 +418,23 @@ class WebMeshtasticLogger:
         
         while self.running:
             try:
-                self.update_position()
+                if self.gps_serial:
+                    # Read the GPS while the node fetch runs on the executor
+                    fetch = self._exec.submit(self.get_nodes)
+                    self.get_gps_position()
+                    nodes = fetch.result(timeout=15)
+                else:
+                    # Our position comes from the same node list
+                    nodes = self.get_nodes()
+                    self.get_meshtastic_position(nodes)
                 
-                nodes = self.get_nodes()
                 if nodes:
                     self.update_seen_nodes(nodes)
+                self.publish_data()
                 
-                time.sleep(10)
+                # Wait before next poll, or until a packet arrives
+                self._wake.wait(10)
+                self._wake.clear()
                 
             except Exception as e:
                 print(f"Loop error: {e}")
@@ -334,6 +445,12 @@ class WebMeshtasticLogger:
         self.running = False
         if self.gps_serial:
             self.gps_serial.close()
+        if self.iface:
+            self.iface.close()
+        # Let the writer thread drain the queue before closing the CSV
+        self._write_q.put(None)
+        self._writer_thread.join(timeout=5)
+        self._csv_fp.close()
         print(f"\n\nStopping logger... Total unique nodes seen: {len(self.seen_nodes)}")
         sys.exit(0)
     